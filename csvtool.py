@@ -5,10 +5,14 @@
 
 import argparse
 import csv
+import functools
 import logging
 import operator
+import os
 import sys
-from itertools import chain
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import chain, islice
 from typing import List
 
 
@@ -74,7 +78,7 @@ version = Version(0, 6, 0)
 
 def eprint(*args, **kwargs):
     """Print to stderr."""
-    print(*args, **kwargs, file=sys.stdout)  # NoQA: T201
+    print(*args, **kwargs, file=sys.stderr)  # NoQA: T201
 
 
 def range_normalizer(ranges: str, ulim: int = 2**128):
@@ -94,54 +98,122 @@ def range_normalizer(ranges: str, ulim: int = 2**128):
     ranges = ranges.split(',')
     normalized_sequences = []
     for sequence in ranges:
-        atoms = sequence.split('-')
-        if len(atoms) == 0:
-            continue
-        elif len(atoms) == 1:
-            if atoms == ['']:
+        lbound_atom, separator, ubound_atom = sequence.partition('-')
+        if separator == '':
+            if lbound_atom == '':
                 continue
-            else:
-                lbound = int(atoms[0])
-                ubound = int(atoms[0])
-        elif len(atoms) == 2:
-            if atoms[0] == '':
+            lbound = int(lbound_atom)
+            ubound = lbound
+        else:
+            if lbound_atom == '':
                 lbound = 0
             else:
-                lbound = int(atoms[0])
+                lbound = int(lbound_atom)
 
-            if atoms[1] == '':
+            if ubound_atom == '':
                 ubound = ulim
             else:
-                ubound = int(atoms[1])
-        else:
-            raise ValueError(f'expected 0, 1 or 2. got {len(atoms)}')
+                ubound = int(ubound_atom)
+                if ubound < 0:
+                    raise ValueError(f'malformed range "{sequence}"')
         normalized_sequences.append((lbound, ubound))
     normalized_sequences = sorted(normalized_sequences, key=operator.itemgetter(0, 1))
 
-    l1 = len(normalized_sequences) - 1
-    l2 = len(normalized_sequences)
-    n1 = 0
-    while n1 < l1:
-        n2 = n1 + 1
-        while n2 < l2:
-            seq1_0 = normalized_sequences[n1][0]
-            seq1_1 = normalized_sequences[n1][1]
-            seq2_0 = normalized_sequences[n2][0]
-            seq2_1 = normalized_sequences[n2][1]
-
-            modified = False
-            if seq1_0 <= seq2_0 and seq1_1 >= seq2_0 - 1:
-                normalized_sequences[n1] = (seq1_0, max(seq1_1, seq2_1))
-                modified = True
-
-            if modified is True:
-                l2 -= 1
-                normalized_sequences.pop(n2)
-                continue
+    merged_sequences = []
+    for lbound, ubound in normalized_sequences:
+        if merged_sequences and lbound <= merged_sequences[-1][1] + 1:
+            merged_sequences[-1] = (merged_sequences[-1][0], max(merged_sequences[-1][1], ubound))
+        else:
+            merged_sequences.append((lbound, ubound))
+    return merged_sequences
+
+
+# Largest number of covered indices for which RangeFilter precomputes a
+# membership set instead of binary-searching the range boundaries
+_SET_MEMBERSHIP_LIMIT = 1 << 16
+
+
+@functools.lru_cache(maxsize=64)
+def _normalize_cached(ranges: str):
+    """Return range_normalizer(ranges) as a tuple, memoized by input string.
 
-            n2 += 1
-        n1 += 1
-    return normalized_sequences
+    Callers that re-filter many files with the same range string skip the
+    repeated parse and merge. The result is a tuple so it is safe to share
+    across instances.
+    """
+    return tuple(range_normalizer(ranges))
+
+
+def RangeFilter(iterable, sequences, filter_out=False):  # NoQA: N802
+    """Filter an iterable by index against a csv string of ranges.
+
+    Parameters:
+        iterable    something to which to apply the filter
+        sequences   csv string of sequences (see range_normalizer)
+        filter_out  False to keep, True to discard
+
+    Returns an iterator over the elements of iterable whose index is
+    selected (or rejected, when filter_out is True) by the ranges.
+    Membership is decided by a hash lookup in a precomputed index set
+    when the ranges cover few enough indices, falling back to a binary
+    search over the merged range boundaries otherwise.
+
+    Example:
+        with open('/proc/self/status', 'r') as fp:
+            for line in RangeFilter(fp, '1, 3, 5-', False):
+                print(line)
+    """
+    if isinstance(sequences, str):
+        sequences = _normalize_cached(sequences)
+
+    if len(sequences) == 1 and sequences[0][0] == 0:
+        # A single range anchored at zero degenerates to pass-everything,
+        # first-K or skip-first-K, all of which islice runs in C without
+        # per-row index arithmetic
+        ubound = sequences[0][1]
+        if ubound >= sys.maxsize:
+            if filter_out is True:
+                return iter(())
+            return iter(iterable)
+        if filter_out is True:
+            return islice(iterable, ubound + 1, None)
+        return islice(iterable, ubound + 1)
+
+    covered = sum(ubound - lbound + 1 for (lbound, ubound) in sequences)
+    if covered <= _SET_MEMBERSHIP_LIMIT:
+        selected = frozenset(chain.from_iterable(range(l, u + 1) for (l, u) in sequences))
+        predicate = lambda iv: (iv[0] in selected) ^ filter_out  # NoQA: E731
+    else:
+        bounds = [bound for (lbound, ubound) in sequences for bound in (lbound, ubound + 1)]
+        predicate = lambda iv: (bisect_right(bounds, iv[0]) & 1) ^ filter_out  # NoQA: E731
+    return map(operator.itemgetter(1), filter(predicate, enumerate(iterable)))
+
+
+# Sentinel marking an exhausted sequence generator, so range_iter never
+# pays for a StopIteration exception per row
+_END = object()
+
+
+def range_iter(iterable, sequences, filter_out=False):
+    """Yield elements of iterable whose index is selected by the ranges.
+
+    Generator-function core of RangeIterator: locals replace the attribute
+    state machine and the for loop absorbs StopIteration handling.
+    """
+    if isinstance(sequences, str):
+        sequences = _normalize_cached(sequences)
+    targets = chain.from_iterable(range(l, u + 1) for (l, u) in sequences)
+    target = next(targets, _END)
+    for index, value in enumerate(iterable):
+        if index == target:
+            target = next(targets, _END)
+            if filter_out is False:
+                yield value
+                if target is _END:
+                    return
+        else:
+            if filter_out is True:
+                yield value
 
 
 class RangeIterator:
@@ -158,10 +230,7 @@ class RangeIterator:
                 print(line)
     """
 
-    _enumeration = None
-    _iter = None
     _iterable = None
-    _sequence_item = None
     _sequences = None
     _filter_out = None
 
@@ -170,47 +239,13 @@ class RangeIterator:
         self._filter_out = filter_out
         self._iterable = iterable
         if isinstance(sequences, str):
-            self._sequences = range_normalizer(sequences)
+            self._sequences = _normalize_cached(sequences)
         else:
             self._sequences = sequences
 
     def __iter__(self):
         """Construct iterator."""
-        # Iterable
-        self._iter = enumerate(self._iterable)
-
-        # Sequencing
-        self._generator = chain(*[range(l, u + 1) for (l, u) in self._sequences])
-        self._sequence_item = next(self._generator)
-
-        self._end_iter_encountered = False
-        self._end_sequence_encountered = False
-
-        return self
-
-    def __next__(self):
-        """Increment iterator."""
-        self._enumeration = next(self._iter)
-        while self._end_iter_encountered is False:
-            val = self._enumeration[1]
-            if self._enumeration[0] == self._sequence_item:
-                try:
-                    self._sequence_item = next(self._generator)
-                except StopIteration:
-                    self._end_sequence_encountered = True
-
-                if self._filter_out is False:
-                    return val
-            else:
-                if self._filter_out is True:
-                    return val
-
-            try:
-                self._enumeration = next(self._iter)
-            except StopIteration:
-                self._end_iter_encountered = True
-
-        raise StopIteration
+        return range_iter(self._iterable, self._sequences, self._filter_out)
 
 
 def argparser_factory() -> argparse.ArgumentParser():
@@ -246,6 +281,16 @@ def argparser_factory() -> argparse.ArgumentParser():
                         help='do not print the data header (default False)',
                         default=False,
                         action='store_true')
+    parser.add_argument('--fast-write',
+                        help='write rows with a plain join instead of the csv writer. '
+                             'No quoting is applied: only use when the selected columns '
+                             'contain no delimiters, quotes or newlines (default False)',
+                        default=False,
+                        action='store_true')
+    parser.add_argument('--backend',
+                        help='csv parsing backend (default stdlib). pyarrow requires the pyarrow package',
+                        choices=['stdlib', 'pyarrow'],
+                        default='stdlib')
     parser.add_argument('--log-level', '-L',
                         help='Logging level',
                         choices=['debug', 'info', 'warning', 'error', 'critical', 'exception'],
@@ -257,6 +302,89 @@ def argparser_factory() -> argparse.ArgumentParser():
     return parser
 
 
+@functools.lru_cache(maxsize=32)
+def _resolve_columns(headers, names):
+    """Resolve column names against a header tuple, memoized.
+
+    Returns the ((name, index), ...) pairs and the largest index, so
+    repeated invocations over files sharing a schema skip the rebuild.
+    Raises KeyError when a name is missing from the header.
+    """
+    name_to_idx = {name: index for index, name in enumerate(headers)}
+    columns = tuple((k, name_to_idx[k]) for k in names)
+    return columns, max(index for _, index in columns)
+
+
+def main_pyarrow(*,
+                 logger: logging.Logger,
+                 filename_input: str,
+                 filename_output: str,
+                 column_names: List[str],
+                 new_columns: List[str],
+                 named_mode: bool,
+                 row_filter: str,
+                 filter_inversion: bool,
+                 print_header: bool):
+    """Entrypoint for the pyarrow backend.
+
+    Streams record batches through pyarrow's C++ csv parser, projecting the
+    requested columns and applying the row filter per batch. The parser
+    always consumes the real header, then the row filter applies to data
+    rows numbered from one. This diverges from the stdlib backend when the
+    filter excludes index zero: there the first kept line is consumed as
+    the header, whereas this backend keeps the header regardless.
+    """
+    try:
+        import pyarrow
+        import pyarrow.csv
+    except ImportError:
+        logger.error('the pyarrow backend requires the pyarrow package')
+        sys.exit(1)
+
+    sequences = range_normalizer(row_filter)
+    bounds = [bound for (lbound, ubound) in sequences for bound in (lbound, ubound + 1)]
+
+    read_options = pyarrow.csv.ReadOptions(block_size=8 << 20)
+    with pyarrow.csv.open_csv(filename_input, read_options=read_options) as batch_reader:
+        headers = batch_reader.schema.names
+
+        if named_mode is True:
+            missing = [column for column in column_names if column not in headers]
+            if len(missing) > 0:
+                logger.error('CSV file header does not contain %s of %s keys: %s',
+                             len(column_names),
+                             len(missing),
+                             ', '.join([f'"{m}"' for m in missing]),
+                             )
+                sys.exit(1)
+            columns = [(k, headers.index(k)) for k in column_names]
+        else:
+            columns = [(headers[column], column) for column in column_names]
+            column_names = [name for name, _ in columns]
+        logger.warning('Working on columns: %s', str(columns))
+
+        indices = [column_index for column_name, column_index in columns]
+        output_names = new_columns if new_columns is not None else column_names
+        schema = pyarrow.schema([(name, pyarrow.string())
+                                 for name in output_names])
+
+        write_options = pyarrow.csv.WriteOptions(include_header=print_header,
+                                                 quoting_style='all_valid')
+        with pyarrow.csv.CSVWriter(filename_output, schema, write_options=write_options) as writer:
+            row_index = 1
+            for batch in batch_reader:
+                mask = [bool((bisect_right(bounds, idx) & 1) ^ filter_inversion)
+                        for idx in range(row_index, row_index + batch.num_rows)]
+                row_index += batch.num_rows
+
+                projected = pyarrow.record_batch(
+                    [batch.column(i).cast(pyarrow.string()) for i in indices],
+                    schema=schema)
+                if not all(mask):
+                    projected = projected.filter(pyarrow.array(mask))
+                writer.write_batch(projected)
+
+
 def main(*,
          logger: logging.Logger,
          filename_input: str,
@@ -266,75 +394,137 @@ def main(*,
          named_mode: bool,
          row_filter: str,
          filter_inversion: bool,
-         print_header: bool):
+         print_header: bool,
+         backend: str = 'stdlib',
+         fast_write: bool = False):
     """Entrypoint."""
-    with open(filename_input, 'r') as fp_input, open(filename_output, 'w') as fp_output:
-        reader = csv.reader(RangeIterator(fp_input, row_filter, filter_inversion))
-
-        writer = csv.writer(fp_output, quoting=csv.QUOTE_NONNUMERIC)
+    if backend == 'pyarrow':
+        main_pyarrow(logger=logger,
+                     filename_input=filename_input,
+                     filename_output=filename_output,
+                     column_names=column_names,
+                     new_columns=new_columns,
+                     named_mode=named_mode,
+                     row_filter=row_filter,
+                     filter_inversion=filter_inversion,
+                     print_header=print_header)
+        return
+
+    with open(filename_input, 'r', buffering=1 << 20, newline='') as fp_input, \
+            open(filename_output, 'w', buffering=1 << 20, newline='') as fp_output:
+        try:
+            os.posix_fadvise(fp_input.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            # Start asynchronous readahead so the kernel fetches upcoming
+            # blocks while the parser consumes earlier ones
+            os.posix_fadvise(fp_input.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        except (AttributeError, OSError):
+            # Not a regular file (e.g. a pipe), or not a POSIX platform
+            pass
+
+        reader = csv.reader(RangeFilter(fp_input, row_filter, filter_inversion))
+
+        if fast_write is True:
+            separator = ','
+
+            def writerow(row):
+                fp_output.write(separator.join(row))
+                fp_output.write('\n')
+
+            def writerows(rows):
+                fp_output.writelines(separator.join(row) + '\n' for row in rows)
+        else:
+            writer = csv.writer(fp_output, quoting=csv.QUOTE_NONNUMERIC)
+            writerow = writer.writerow
+            writerows = writer.writerows
 
         headers = next(reader)
         header_length = len(headers)
         logger.info('Header has %s columns', header_length)
-        histogram = {}
-        histogram[header_length] = header_length
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        min_length = header_length
+        max_length = header_length
+        histogram = defaultdict(int)
 
         if named_mode is True:
-            missing = []
-            for column in column_names:
-                if column not in headers:
-                    missing.append(column)
-            if len(missing) > 0:
+            try:
+                columns, max_header_element = _resolve_columns(tuple(headers), tuple(column_names))
+            except KeyError:
+                missing = [column for column in column_names if column not in headers]
                 logger.error('CSV file header does not contain %s of %s keys: %s',
                              len(column_names),
                              len(missing),
                              ', '.join([f'"{m}"' for m in missing]),
                              )
                 sys.exit(1)
-            columns = [(k, headers.index(k)) for k in column_names]
+            columns = list(columns)
         else:
+            max_header_element = max(column_names)
+            if max_header_element >= header_length:
+                logger.error('Column index %d out of range for header with %d columns',
+                             max_header_element, header_length)
+                sys.exit(1)
             columns = column_names
             column_names = [headers[column] for column in columns]
             columns = [(headers[column], column) for column in columns]
         logger.warning('Working on columns: %s', str(columns))
 
-        max_header_element = max([x[1] for x in columns])
+        indices = [column_index for column_name, column_index in columns]
+        if len(indices) > 1:
+            getcols = operator.itemgetter(*indices)
+        else:
+            getcols = lambda line, column_index=indices[0]: (line[column_index],)  # NoQA: E731
 
         if print_header is True:
             if new_columns is not None:
-                writer.writerow(new_columns)
+                writerow(new_columns)
             else:
-                writer.writerow(column_names)
-
-        for n, line in enumerate(reader, 1):
-            length = len(line)
-            if max_header_element > length - 1:
-                logger.error(f'Bounds error on line {n}')
-            histogram[length] = histogram.get(length, 0) + 1
-            if length != header_length:
-                logger.warn(f'Warning: line[{n}] width ({length}) different to header width ({header_length})')
-            st = [line[column_index] for column_name, column_index in columns]
-            writer.writerow(st)
+                writerow(column_names)
+
+        warn_enabled = logger.isEnabledFor(logging.WARNING)
+        err_enabled = logger.isEnabledFor(logging.ERROR)
+
+        def project():
+            """Yield projected rows, recording per-row width diagnostics."""
+            nonlocal min_length, max_length
+            for n, line in enumerate(reader, 1):
+                length = len(line)
+                if length != header_length:
+                    if max_header_element > length - 1 and err_enabled:
+                        logger.error('Bounds error on line %d', n)
+                    if length < min_length:
+                        min_length = length
+                    elif length > max_length:
+                        max_length = length
+                    if warn_enabled:
+                        logger.warning('Warning: line[%d] width (%d) different to header width (%d)',
+                                       n, length, header_length)
+                if debug_enabled:
+                    histogram[length] += 1
+                yield getcols(line)
+
+        writerows(project())
 
     # Summary diagnostics
-    if len(histogram) != 1:
-        logger.warn('Line size histogram shows there were %s line lengths', len(histogram))
+    if min_length != max_length:
+        logger.warning('Line lengths vary: %d..%d', min_length, max_length)
+        logger.debug('Line size histogram shows there were %s line lengths', len(histogram))
+
+
+_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL,
+}
 
 
 def log_level_from_string(level_string: str, ignore_case: bool = False) -> int:
     """Convert a logging level from a string to the corresponding int."""
-    level_string = level_string.lower()
-    if level_string == 'debug':
-        return logging.DEBUG
-    elif level_string == 'info':
-        return logging.INFO
-    elif level_string == 'warning':
-        return logging.WARNING
-    elif level_string == 'error':
-        return logging.ERROR
-    elif level_string == 'critical':
-        return logging.CRITICAL
-    raise ValueError('Unknown logging level')
+    try:
+        return _LEVELS[level_string.lower()]
+    except KeyError:
+        raise ValueError('Unknown logging level')
 
 
 if __name__ == '__main__':
@@ -378,7 +568,9 @@ if __name__ == '__main__':
              named_mode=args.named,
              row_filter=args.filter,
              filter_inversion=args.invert_filter,
-             print_header=not args.no_print_header)
+             print_header=not args.no_print_header,
+             backend=args.backend,
+             fast_write=args.fast_write)
         exit_code = 0
     except BrokenPipeError:
         exit_code = 0
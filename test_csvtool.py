@@ -3,13 +3,16 @@
 
 """Test suite for csvtool."""
 
+import csv
 import logging
 import operator
 
 from csvtool import (
+    RangeFilter,
     RangeIterator,
     Version,
     log_level_from_string,
+    main,
     range_normalizer,
     version,
 )
@@ -32,6 +35,17 @@ def test_range_skipper(test_input, expected):
     assert range_normalizer(test_input) == expected
 
 
+@pytest.mark.parametrize('test_input',
+                         [('1--2'),
+                          ('--2'),
+                          ('0,1--2'),
+                          ])
+def test_range_skipper__invalid(test_input):
+    """Test malformed range strings raise ValueError."""
+    with pytest.raises(ValueError):
+        range_normalizer(test_input)
+
+
 @pytest.mark.parametrize('test_input,expected',
                          [((range(0, 1), '0', False), [0]),
                           ((range(0, 1), '0', True), []),
@@ -61,6 +75,60 @@ def test_range_filter(test_input, expected):
     assert [*RangeIterator(*test_input)] == expected
 
 
+@pytest.mark.parametrize('test_input,expected',
+                         [((range(0, 1), '0', False), [0]),
+                          ((range(0, 1), '0', True), []),
+                          ((range(0, 2), '0', False), [0]),
+                          ((range(0, 2), '0', True), [1]),
+                          ((range(0, 2), '1', False), [1]),
+                          ((range(0, 2), '1', True), [0]),
+                          ((range(0, 3), '0', False), [0]),
+                          ((range(0, 3), '1', False), [1]),
+                          ((range(0, 3), '2', False), [2]),
+                          ((range(0, 3), '0', True), [1, 2]),
+                          ((range(0, 3), '1', True), [0, 2]),
+                          ((range(0, 3), '2', True), [0, 1]),
+                          ((range(0, 3), '-', False), [0, 1, 2]),
+                          ((range(0, 3), '-', True), []),
+                          ((range(0, 3), '-1', False), [0, 1]),
+                          ((range(0, 3), '-1', True), [2]),
+                          ((range(0, 3), '1-', False), [1, 2]),
+                          ((range(0, 3), '1-', True), [0]),
+                          ((range(0, 10), '0,2-4,8-', False), [0, 2, 3, 4, 8, 9]),
+                          ((range(0, 10), '0,2-4,8-', True), [1, 5, 6, 7]),
+                          ((range(0, 9), '0,2-4,8', False), [0, 2, 3, 4, 8]),
+                          ((range(0, 9), '0,2-4,8', True), [1, 5, 6, 7]),
+                          ])
+def test_range_filter_factory(test_input, expected):
+    """Test a variety of inputs to validate RangeFilter."""
+    assert [*RangeFilter(*test_input)] == expected
+
+
+@pytest.mark.parametrize('row_filter,filter_inversion,expected',
+                         [('-', False, [['a', 'c'], ['1', '3'], ['4', '6'], ['7', '9']]),
+                          ('1-2', False, [['a', 'c'], ['1', '3'], ['4', '6']]),
+                          ('1-2', True, [['a', 'c'], ['7', '9']]),
+                          ])
+def test_main_pyarrow_row_filter(tmp_path, row_filter, filter_inversion, expected):
+    """Test the pyarrow backend applies the row filter to data rows."""
+    pytest.importorskip('pyarrow')
+    filename_input = tmp_path / 'input.csv'
+    filename_input.write_text('a,b,c\n1,2,3\n4,5,6\n7,8,9\n')
+    filename_output = tmp_path / 'output.csv'
+    main(logger=logging.getLogger('csv-tool'),
+         filename_input=str(filename_input),
+         filename_output=str(filename_output),
+         column_names=[0, 2],
+         new_columns=None,
+         named_mode=False,
+         row_filter=row_filter,
+         filter_inversion=filter_inversion,
+         print_header=True,
+         backend='pyarrow')
+    with open(filename_output, newline='') as fp_output:
+        assert [*csv.reader(fp_output)] == expected
+
+
 # +---+-----+
 # | I | R   |
 # +---+-----+